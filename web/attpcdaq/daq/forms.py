@@ -1,4 +1,5 @@
 from django import forms
+from django.utils.functional import cached_property
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit, Layout, Fieldset, HTML
 from crispy_forms.bootstrap import FormActions, AppendedText
@@ -7,15 +8,25 @@ from .models import DataSource, ECCServer, DataRouter, Experiment, ConfigId, Run
 
 
 class CrispyModelFormBase(forms.ModelForm):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.form_class = 'form-horizontal'
-        self.helper.label_class = 'col-lg-2'
-        self.helper.field_class = 'col-lg-8'
+    """A base for model forms that are rendered using crispy_forms.
+
+    The form's :class:`FormHelper` is only built the first time :attr:`helper` is accessed, so forms that are
+    validated but never rendered don't pay for it. Subclasses can customize it by overriding :meth:`make_helper`.
+    """
+    @cached_property
+    def helper(self):
+        return self.make_helper()
+
+    def make_helper(self):
+        helper = FormHelper()
+        helper.form_method = 'post'
+        helper.form_class = 'form-horizontal'
+        helper.label_class = 'col-lg-2'
+        helper.field_class = 'col-lg-8'
+
+        helper.add_input(Submit('submit', 'Submit'))
 
-        self.helper.add_input(Submit('submit', 'Submit'))
+        return helper
 
 
 class DataSourceForm(CrispyModelFormBase):
@@ -75,21 +86,23 @@ class ExperimentForm(CrispyModelFormBase):
 class ExperimentChoiceForm(forms.Form):
     experiment = forms.ModelChoiceField(queryset=Experiment.objects.all(), label='Choose experiment')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
+    @cached_property
+    def helper(self):
+        helper = FormHelper()
+        helper.form_method = 'post'
 
         new_expt_btn_html = """
         <a href='{% url "daq/new_experiment" %}' class='btn btn-success btn-block'>New experiment</a>
         """
-        self.helper.layout = Layout(
+        helper.layout = Layout(
             'experiment',
             Submit('submit', 'Load experiment', css_class='btn btn-primary btn-block'),
             HTML("<p class='text-center'>or</h3>"),
             HTML(new_expt_btn_html),
         )
 
+        return helper
+
 
 class NewExperimentForm(forms.ModelForm):
     class Meta:
@@ -97,12 +110,14 @@ class NewExperimentForm(forms.ModelForm):
         fields = ['name']
         labels = {'name': 'Experiment name'}
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
+    @cached_property
+    def helper(self):
+        helper = FormHelper()
+        helper.form_method = 'post'
+
+        helper.add_input(Submit('submit', 'Create experiment', css_class='btn btn-primary btn-block'))
 
-        self.helper.add_input(Submit('submit', 'Create experiment', css_class='btn btn-primary btn-block'))
+        return helper
 
     def save(self, commit=True):
         """Override to make the new experiment the active one."""
@@ -122,7 +137,7 @@ class RunMetadataForm(CrispyModelFormBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        observables = Observable.objects.filter(experiment=self.instance.experiment)
+        self.observables = Observable.objects.filter(experiment=self.instance.experiment)
 
         field_type_map = {
             Observable.INTEGER: forms.IntegerField,
@@ -130,20 +145,23 @@ class RunMetadataForm(CrispyModelFormBase):
             Observable.STRING: forms.CharField,
         }
 
-        for obs in observables:
+        for obs in self.observables:
             measurement, created = Measurement.objects.get_or_create(run_metadata=self.instance, observable=obs)
             field_type = field_type_map[obs.value_type]
             self.fields[obs.name] = field_type(initial=measurement.value, required=False, help_text=obs.comment)
 
+    def make_helper(self):
+        helper = super().make_helper()
+
         # Build form layout
-        self.helper.inputs = None  # Override default input provided by base class
+        helper.inputs = None  # Override default input provided by base class
         run_fieldset = Fieldset(
             'Run information',
             *self.Meta.fields
         )
         measurement_fieldset = Fieldset(
             'Measurements',
-            *(AppendedText(obs.name, obs.units) if obs.units else obs.name for obs in observables)
+            *(AppendedText(obs.name, obs.units) if obs.units else obs.name for obs in self.observables)
         )
         prepop_btn_html = """
             <a href="{{% url 'daq/update_run_metadata' {:d} %}}?prepopulate=True"
@@ -155,12 +173,14 @@ class RunMetadataForm(CrispyModelFormBase):
             Submit('submit', 'Submit'),
             HTML(prepop_btn_html),
         )
-        self.helper.layout = Layout(
+        helper.layout = Layout(
             run_fieldset,
             measurement_fieldset,
             buttons,
         )
 
+        return helper
+
     def save(self, commit=True):
         for name, value in self.cleaned_data.items():
             if name in self.Meta.fields:
@@ -196,12 +216,13 @@ class ObservableForm(CrispyModelFormBase):
 class DataSourceListUploadForm(forms.Form):
     data_source_list = forms.FileField()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_id = 'datasource-list-upload-form'
-        self.helper.form_method = 'post'
-        self.helper.add_input(Submit('submit', 'Submit'))
+    @cached_property
+    def helper(self):
+        helper = FormHelper()
+        helper.form_id = 'datasource-list-upload-form'
+        helper.form_method = 'post'
+        helper.add_input(Submit('submit', 'Submit'))
+        return helper
 
 
 class EasySetupForm(forms.Form):
@@ -236,11 +257,11 @@ class EasySetupForm(forms.Form):
     mutant_config_backup_root = forms.CharField(max_length=500, required=False,
                                                 label='MuTAnT config file backup destination')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_id = 'easy-setup-form'
-        self.helper.form_method = 'post'
+    @cached_property
+    def helper(self):
+        helper = FormHelper()
+        helper.form_id = 'easy-setup-form'
+        helper.form_method = 'post'
 
         general_help = """
             <div>
@@ -280,7 +301,7 @@ class EasySetupForm(forms.Form):
             </div>
         """
 
-        self.helper.layout = Layout(
+        helper.layout = Layout(
             HTML(general_help),
             Fieldset(
                 'CoBo setup',
@@ -309,6 +330,8 @@ class EasySetupForm(forms.Form):
             FormActions(Submit('submit', 'Submit'))
         )
 
+        return helper
+
     def clean(self):
         super().clean()
 
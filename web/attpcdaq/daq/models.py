@@ -10,7 +10,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
 import xml.etree.ElementTree as ET
-from zeep import Client as SoapClient
+from zeep import Client as SoapClient, Transport
 import os
 from datetime import datetime
 
@@ -23,8 +23,17 @@ class ECCError(Exception):
     pass
 
 
+#: Timeout, in seconds, for each SOAP request to an ECC server. The ECC tasks run in a thread pool, where Celery's
+#: time limits are not enforced, so this keeps an unresponsive ECC server from tying up a worker thread.
+ECC_TIMEOUT = 8
+
+#: Timeout, in seconds, for a SOAP request that makes the ECC server perform a transition. These can take much
+#: longer than other requests, so this is close to the time limit of the task that changes the state.
+ECC_TRANSITION_TIMEOUT = 40
+
+
 class EccClient(object):
-    def __init__(self, ecc_url):
+    def __init__(self, ecc_url, timeout=ECC_TIMEOUT):
         """A wrapper around the Zeep library's SOAP client.
 
         This exists to help prevent future problems if the Client class from zeep changes. That
@@ -59,10 +68,13 @@ class EccClient(object):
         ----------
         ecc_url : str
             The full URL of the ECC server (i.e. "http://{address}:{port}").
+        timeout : float, optional
+            The timeout, in seconds, for each request to the server.
 
         """
         wsdl_url = os.path.join(settings.BASE_DIR, 'attpcdaq', 'daq', 'ecc.wsdl')
-        client = SoapClient(wsdl_url)  # Loads the service definition from ecc.wsdl
+        transport = Transport(timeout=timeout, operation_timeout=timeout)
+        client = SoapClient(wsdl_url, transport=transport)  # Loads the service definition from ecc.wsdl
         self.service = client.create_service('{urn:ecc}ecc', ecc_url)  # This overrides the default URL from the file
 # This line prevents zeep from writing the namespace in the xml code. BUG BUG BUG
         client.set_ns_prefix(None, 'urn:ecc')
@@ -293,19 +305,24 @@ class ECCServer(models.Model):
 
         return tuple(paths)
 
-    def _get_soap_client(self):
+    def _get_soap_client(self, timeout=ECC_TIMEOUT):
         """Creates a SOAP client for communicating with the ECC server.
 
         The client loads the WSDL file, which describes the SOAP services, from the local disk. The
         target URL of the client is then set to the ECC server's address.
 
+        Parameters
+        ----------
+        timeout : float, optional
+            The timeout, in seconds, for each request to the server.
+
         Returns
         -------
         EccClient
             The configured SOAP client.
 
         """
-        return EccClient(self.ecc_url)
+        return EccClient(self.ecc_url, timeout=timeout)
 
     @classmethod
     def _get_transition(cls, client, current_state, target_state):
@@ -383,7 +400,7 @@ class ECCServer(models.Model):
 
         """
         datalink_set = ET.Element('DataLinkSet')
-        for source in self.datasource_set.all():
+        for source in self.datasource_set.select_related('data_router'):
             source_node = source.get_data_link_xml()
             datalink_set.append(source_node)
 
@@ -418,7 +435,13 @@ class ECCServer(models.Model):
         """Gets the current state of the data source from the ECC server and updates the database.
 
         This will update the :attr:`~ECCServer.state` and :attr:`~ECCServer.is_transitioning` fields of the
-        :class:`ECCServer`.
+        :class:`ECCServer`. Since this is polled frequently and the state rarely changes, the database is only
+        written to if one of these fields has actually changed, and then only these two columns are updated.
+
+        Returns
+        -------
+        bool
+            True if the state changed and was written to the database.
 
         Raises
         ------
@@ -431,9 +454,16 @@ class ECCServer(models.Model):
         if int(result.ErrorCode) != 0:
             raise ECCError(result.ErrorMessage)
 
-        self.state = int(result.State)
-        self.is_transitioning = int(result.Transition) != 0
-        self.save()
+        new_state = int(result.State)
+        new_is_transitioning = int(result.Transition) != 0
+
+        if new_state == self.state and new_is_transitioning == self.is_transitioning:
+            return False
+
+        self.state = new_state
+        self.is_transitioning = new_is_transitioning
+        self.save(update_fields=['state', 'is_transitioning'])
+        return True
 
     def change_state(self, target_state):
         """Tells the ECC server to transition the data source to a new state.
@@ -461,7 +491,7 @@ class ECCServer(models.Model):
 
         datalink_xml = self.get_data_link_xml_from_clients()
 
-        client = self._get_soap_client()
+        client = self._get_soap_client(timeout=ECC_TRANSITION_TIMEOUT)
 
         # Get the function corresponding to the requested transition
         transition = self._get_transition(client, self.state, target_state)
@@ -909,3 +939,4 @@ class Measurement(models.Model):
             received_type = type(new_value)
             raise ValueError('New value was of type{:s}. Expected {:s}.'.format(
                 str(received_type), str(self.python_type)))
+
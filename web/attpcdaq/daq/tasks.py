@@ -9,8 +9,12 @@ from .workertasks import WorkerInterface
 import logging
 logger = logging.getLogger(__name__)
 
+#: Seconds after which a queued :func:`eccserver_refresh_state_task` is discarded if it hasn't started. This
+#: matches the polling period in ``CELERYBEAT_SCHEDULE``, so by then a newer refresh has already been queued.
+REFRESH_STATE_EXPIRES = 5
 
-@shared_task(soft_time_limit=5, time_limit=10)
+
+@shared_task(ignore_result=True, soft_time_limit=5, time_limit=10)
 def eccserver_refresh_state_task(eccserver_pk):
     """Fetch the state of the given ECC server.
 
@@ -41,21 +45,23 @@ def eccserver_refresh_state_task(eccserver_pk):
 def eccserver_refresh_all_task():
     """Fetch the state of all ECC servers.
 
-    This calls :func:`eccserver_refresh_state_task` for each ECC server in the database.
+    This calls :func:`eccserver_refresh_state_task` for each ECC server in the database. The subtasks
+    expire after :data:`REFRESH_STATE_EXPIRES` seconds, so refreshes for a slow server don't accumulate.
 
     """
     try:
-        pk_list = ECCServer.objects.filter(experiment__is_active=True).values_list('pk', flat=True)
-        if pk_list.exists():
-            gp = group([eccserver_refresh_state_task.s(i) for i in pk_list])
-            gp()
+        pk_list = list(ECCServer.objects.filter(experiment__is_active=True).values_list('pk', flat=True))
+        if pk_list:
+            gp = group([eccserver_refresh_state_task.s(i).set(ignore_result=True, expires=REFRESH_STATE_EXPIRES)
+                        for i in pk_list])
+            gp.apply_async()
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while refreshing state of all ECC servers')
     except Exception:
         logger.exception('Failed to refresh state of all ECC servers')
 
 
-@shared_task(soft_time_limit=45, time_limit=60)
+@shared_task(ignore_result=True, soft_time_limit=45, time_limit=60)
 def eccserver_change_state_task(eccserver_pk, target_state):
     """Change the state of an ECC server (make it perform a transition).
 
@@ -71,7 +77,7 @@ def eccserver_change_state_task(eccserver_pk, target_state):
         The target state. Use one of the constants from the :class:`~attpcdaq.daq.models.ECCServer` class.
     """
     try:
-        ecc_server = ECCServer.objects.get(pk=eccserver_pk)
+        ecc_server = ECCServer.objects.select_related('selected_config').get(pk=eccserver_pk)
     except ECCServer.DoesNotExist:
         logger.error('No ECC server exists with pk %d', eccserver_pk)
         return
@@ -84,7 +90,7 @@ def eccserver_change_state_task(eccserver_pk, target_state):
         logger.exception('Failed to change state of %s', ecc_server.name)
 
 
-@shared_task(soft_time_limit=10, time_limit=40)
+@shared_task(ignore_result=True, soft_time_limit=10, time_limit=40)
 def check_ecc_server_online_task(eccserver_pk):
     """Checks if the ECC server is online.
 
@@ -109,7 +115,7 @@ def check_ecc_server_online_task(eccserver_pk):
             ecc_alive = wint.check_ecc_server_status()
 
         ecc_server.is_online = ecc_alive
-        ecc_server.save()
+        ecc_server.save(update_fields=['is_online'])
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while checking whether %s is online', ecc_server.name)
     except Exception:
@@ -124,25 +130,24 @@ def check_ecc_server_online_all_task():
 
     """
     try:
-        pks = ECCServer.objects.filter(experiment__is_active=True).values_list('pk', flat=True)
-        if pks.exists():
-            gp = group([check_ecc_server_online_task.s(i) for i in pks])
-            gp()
+        pks = list(ECCServer.objects.filter(experiment__is_active=True).values_list('pk', flat=True))
+        if pks:
+            gp = group([check_ecc_server_online_task.s(i).set(ignore_result=True) for i in pks])
+            gp.apply_async()
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while refreshing state of all ECC servers')
     except Exception:
         logger.exception('Failed to refresh state of all ECC servers')
 
 
-@shared_task(soft_time_limit=10, time_limit=40)
+@shared_task(ignore_result=True, soft_time_limit=10, time_limit=40)
 def check_data_router_status_task(datarouter_pk):
     """Checks whether the data router is online and if the staging directory is clean.
 
-    This is done by checking if the process is running via SSH. Specifically, the method
-    :meth:`~attpcdaq.daq.workertasks.WorkerInterface.check_data_router_status` of the
-    :class:`~attpcdaq.daq.workertasks.WorkerInterface` object is used. Then, the staging directory
-    is checked for GRAW files using :meth:`~attpcdaq.daq.workertasks.WorkerInterface.working_dir_is_clean`
-    from the same class.
+    This is done via SSH using the method
+    :meth:`~attpcdaq.daq.workertasks.WorkerInterface.probe_router_status` of the
+    :class:`~attpcdaq.daq.workertasks.WorkerInterface` object, which checks both things using
+    a single remote command.
 
     Parameters
     ----------
@@ -158,15 +163,18 @@ def check_data_router_status_task(datarouter_pk):
 
     try:
         with WorkerInterface(data_router.ip_address) as wint:
-            data_router_alive = wint.check_data_router_status()
-            data_router.is_online = data_router_alive
+            data_router_alive, staging_dir_clean = wint.probe_router_status()
 
-            if data_router_alive:
-                # If the router isn't running, this next step will fail anyway
-                staging_dir_clean = wint.working_dir_is_clean()
-                data_router.staging_directory_is_clean = staging_dir_clean
+        # Only write the fields set here, so this doesn't overwrite changes made elsewhere in the meantime
+        data_router.is_online = data_router_alive
+        update_fields = ['is_online']
 
-        data_router.save()
+        if data_router_alive:
+            # The staging directory can only be checked if the router is running
+            data_router.staging_directory_is_clean = staging_dir_clean
+            update_fields.append('staging_directory_is_clean')
+
+        data_router.save(update_fields=update_fields)
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while checking whether %s is online', data_router.name)
     except Exception:
@@ -181,17 +189,17 @@ def check_data_router_status_all_task():
 
     """
     try:
-        pks = DataRouter.objects.filter(experiment__is_active=True).values_list('pk', flat=True)
-        if pks.exists():
-            gp = group([check_data_router_status_task.s(i) for i in pks])
-            gp()
+        pks = list(DataRouter.objects.filter(experiment__is_active=True).values_list('pk', flat=True))
+        if pks:
+            gp = group([check_data_router_status_task.s(i).set(ignore_result=True) for i in pks])
+            gp.apply_async()
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while refreshing state of all data routers')
     except Exception:
         logger.exception('Failed to refresh state of all data routers')
 
 
-@shared_task(soft_time_limit=30, time_limit=40)
+@shared_task(ignore_result=True, soft_time_limit=30, time_limit=40)
 def organize_files_task(datarouter_pk, experiment_pk, run_pk):
     """Connects to the DAQ worker nodes to organize files at the end of a run.
 
@@ -222,7 +230,7 @@ def organize_files_task(datarouter_pk, experiment_pk, run_pk):
             wint.organize_files(experiment.name, run.run_number)
 
         router.staging_directory_is_clean = True
-        router.save()
+        router.save(update_fields=['staging_directory_is_clean'])
 
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while organizing files at for data source %s', router.name)
@@ -245,17 +253,17 @@ def organize_files_all_task(experiment_pk, run_pk):
 
     """
     try:
-        pk_list = DataRouter.objects.filter(experiment__pk=experiment_pk).values_list('pk', flat=True)
-        if pk_list.exists():
-            gp = group([organize_files_task.s(i, experiment_pk, run_pk) for i in pk_list])
-            gp()
+        pk_list = list(DataRouter.objects.filter(experiment__pk=experiment_pk).values_list('pk', flat=True))
+        if pk_list:
+            gp = group([organize_files_task.s(i, experiment_pk, run_pk).set(ignore_result=True) for i in pk_list])
+            gp.apply_async()
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while rearranging remote files on all nodes')
     except Exception:
         logger.exception('Failed to reorganize files on all nodes')
 
 
-@shared_task(soft_time_limit=30, time_limit=40)
+@shared_task(ignore_result=True, soft_time_limit=30, time_limit=40)
 def backup_config_files_task(ecc_pk, experiment_pk, run_pk):
     """Makes a backup copy of the config files for the most recent run.
 
@@ -277,7 +285,7 @@ def backup_config_files_task(ecc_pk, experiment_pk, run_pk):
     try:
         experiment = Experiment.objects.get(pk=experiment_pk)
         run = RunMetadata.objects.get(pk=run_pk)
-        ecc = ECCServer.objects.get(pk=ecc_pk)
+        ecc = ECCServer.objects.select_related('selected_config').get(pk=ecc_pk)
     except ObjectDoesNotExist:
         logger.exception('One of the provided primary keys was invalid')
         return
@@ -307,13 +315,13 @@ def backup_config_files_all_task(experiment_pk, run_pk):
 
     """
     try:
-        ecc_pks = ECCServer.objects.filter(experiment__pk=experiment_pk).values_list('pk', flat=True)
-        if not ecc_pks.exists():
+        ecc_pks = list(ECCServer.objects.filter(experiment__pk=experiment_pk).values_list('pk', flat=True))
+        if not ecc_pks:
             logger.error('Config backup failed: There were no ECC servers for the given experiment.')
             return
 
-        gp = group([backup_config_files_task.s(pk, experiment_pk, run_pk) for pk in ecc_pks])
-        gp()
+        gp = group([backup_config_files_task.s(pk, experiment_pk, run_pk).set(ignore_result=True) for pk in ecc_pks])
+        gp.apply_async()
     except SoftTimeLimitExceeded:
         logger.error('Time limit exceeded while backing up config files on all nodes')
     except Exception:
@@ -4,7 +4,7 @@ from django.test import TestCase
 from django import forms
 
 from ..forms import RunMetadataForm, DataSourceForm, ECCServerForm, DataRouterForm, ConfigSelectionForm, ObservableForm
-from ..models import RunMetadata, Observable, Measurement, Experiment, DataSource, ECCServer, DataRouter
+from ..models import RunMetadata, Observable, Measurement, Experiment, DataSource, ECCServer, DataRouter, ConfigId
 
 
 class TestModelFormFieldsMixin(object):
@@ -27,6 +27,15 @@ class DataSourceFormTestCase(TestModelFormFieldsMixin, TestCase):
         self.model = DataSource
         self.form = DataSourceForm
 
+    def test_helper_built_on_first_access(self):
+        form = self.form()
+        self.assertNotIn('helper', form.__dict__)
+
+        helper = form.helper
+        self.assertIs(form.helper, helper)
+        self.assertEqual(helper.form_method, 'post')
+        self.assertEqual([i.name for i in helper.inputs], ['submit'])
+
 
 class ECCServerFormTestCase(TestModelFormFieldsMixin, TestCase):
     def setUp(self):
@@ -54,6 +63,40 @@ class ConfigSelectionFormTestCase(TestModelFormFieldsMixin, TestCase):
     def get_expected_fields(self):
         return {'selected_config'}
 
+    def _make_ecc_server(self, name, experiment):
+        ecc_server = ECCServer.objects.create(
+            name=name,
+            ip_address='123.123.123.123',
+            experiment=experiment,
+        )
+        config = ConfigId.objects.create(
+            describe='describe',
+            prepare='prepare',
+            configure=name,
+            ecc_server=ecc_server,
+        )
+        return ecc_server, config
+
+    def test_only_offers_own_configs(self):
+        experiment = Experiment.objects.create(name='Test')
+        ecc_server, config = self._make_ecc_server('ECC0', experiment)
+        self._make_ecc_server('ECC1', experiment)
+
+        form = self.form(instance=ecc_server)
+        self.assertEqual(list(form.fields['selected_config'].queryset), [config])
+
+    def test_save_updates_instance(self):
+        experiment = Experiment.objects.create(name='Test')
+        ecc_server, config = self._make_ecc_server('ECC0', experiment)
+
+        form = self.form({'selected_config': config.pk}, instance=ecc_server)
+        self.assertTrue(form.is_valid())
+        saved = form.save()
+
+        self.assertIs(saved, ecc_server)
+        ecc_server.refresh_from_db()
+        self.assertEqual(ecc_server.selected_config, config)
+
 
 class RunMetadataFormTestCase(TestModelFormFieldsMixin, TestCase):
     def setUp(self):
@@ -95,6 +138,16 @@ class RunMetadataFormTestCase(TestModelFormFieldsMixin, TestCase):
     def get_excluded_fields(self):
         return {'experiment'}
 
+    def test_helper_layout(self):
+        form = self.form(instance=self.run)
+        helper = form.helper
+
+        self.assertFalse(helper.inputs)
+
+        run_fieldset, measurement_fieldset, buttons = helper.layout.fields
+        self.assertEqual(list(run_fieldset.fields), RunMetadataForm.Meta.fields)
+        self.assertEqual(list(measurement_fieldset.fields), [obs.name for obs in self.observables])
+
     def test_has_fields_for_observables(self):
         form = RunMetadataForm(instance=self.run)
 
@@ -2,7 +2,7 @@ from django.test import TestCase
 from unittest.mock import patch
 from .utilities import FakeResponseState, FakeResponseText
 from ..models import DataSource, ECCServer, DataRouter, ConfigId, Experiment, RunMetadata, Observable, Measurement
-from ..models import ECCError
+from ..models import ECCError, ECC_TIMEOUT, ECC_TRANSITION_TIMEOUT
 import xml.etree.ElementTree as ET
 import os
 from itertools import permutations, product
@@ -118,6 +118,33 @@ class ECCServerModelTestCase(TestCase):
 
         self.assertEqual(result, expected)
 
+    def test_soap_client_has_timeout(self):
+        with patch('attpcdaq.daq.models.SoapClient') as mock_client:
+            self.ecc_server._get_soap_client()
+
+        transport = mock_client.call_args[1]['transport']
+        self.assertEqual(transport.operation_timeout, ECC_TIMEOUT)
+        self.assertEqual(transport.load_timeout, ECC_TIMEOUT)
+
+    def test_data_link_xml_fetches_routers_with_sources(self):
+        for i in range(5):
+            data_router = DataRouter.objects.create(
+                name='DataRouter{}'.format(i),
+                ip_address='123.123.123.123',
+                experiment=self.experiment,
+            )
+            DataSource.objects.create(
+                name='CoBo[{}]'.format(i),
+                ecc_server=self.ecc_server,
+                data_router=data_router,
+            )
+
+        with self.assertNumQueries(1):
+            xml_string = self.ecc_server.get_data_link_xml_from_clients()
+
+        root = ET.fromstring(xml_string)
+        self.assertEqual(len(root.findall('DataLink')), 5)
+
     def data_link_xml_test_impl(self):
         xml_string = self.ecc_server.get_data_link_xml_from_clients()
         root = ET.fromstring(xml_string)
@@ -256,10 +283,29 @@ class ECCServerModelTestCase(TestCase):
                 self.ecc_server.refresh_state()
 
                 mock_inst.GetState.assert_called_once_with()
+                mock_client.assert_called_once_with(self.ecc_server.ecc_url, timeout=ECC_TIMEOUT)
 
             self.assertEqual(self.ecc_server.state, state)
             self.assertEqual(self.ecc_server.is_transitioning, trans)
 
+            self.ecc_server.refresh_from_db()
+            self.assertEqual(self.ecc_server.state, state)
+            self.assertEqual(self.ecc_server.is_transitioning, trans)
+
+    def test_refresh_state_skips_write_if_unchanged(self):
+        self.ecc_server.state = ECCServer.PREPARED
+        self.ecc_server.is_transitioning = False
+        self.ecc_server.save()
+
+        with patch('attpcdaq.daq.models.EccClient') as mock_client:
+            mock_inst = mock_client.return_value
+            mock_inst.GetState.return_value = FakeResponseState(state=ECCServer.PREPARED, trans=False)
+
+            with self.assertNumQueries(0):
+                changed = self.ecc_server.refresh_state()
+
+        self.assertFalse(changed)
+
     def _transition_test_helper(self, trans_func_name, initial_state, final_state,
                                 error_code=0, error_msg=""):
         with patch('attpcdaq.daq.models.EccClient') as mock_client:
@@ -275,6 +321,7 @@ class ECCServerModelTestCase(TestCase):
             config_xml = self.ecc_server.selected_config.as_xml()
             datalink_xml = self.ecc_server.get_data_link_xml_from_clients()
             mock_trans_func.assert_called_once_with(config_xml, datalink_xml)
+            mock_client.assert_called_once_with(self.ecc_server.ecc_url, timeout=ECC_TRANSITION_TIMEOUT)
 
             self.assertTrue(self.ecc_server.is_transitioning)
 
@@ -591,3 +638,4 @@ class MeasurementModelTestCase(TestCase):
         self._serialization_test_impl(Observable.FLOAT, 'string')
         self._serialization_test_impl(Observable.STRING, 4)
         self._serialization_test_impl(Observable.INTEGER, 4.5)
+
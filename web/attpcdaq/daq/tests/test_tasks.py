@@ -8,7 +8,7 @@ from celery.exceptions import SoftTimeLimitExceeded
 from ..tasks import organize_files_task, eccserver_refresh_state_task, eccserver_change_state_task
 from ..tasks import check_ecc_server_online_task, check_data_router_status_task, organize_files_all_task
 from ..tasks import eccserver_refresh_all_task, check_ecc_server_online_all_task, check_data_router_status_all_task
-from ..tasks import backup_config_files_task, backup_config_files_all_task
+from ..tasks import backup_config_files_task, backup_config_files_all_task, REFRESH_STATE_EXPIRES
 from ..models import ECCServer, DataRouter, ConfigId, Experiment, RunMetadata
 
 
@@ -129,7 +129,19 @@ class TestCalledForAllMixin(object):
 
         gp = self.get_callable('group')
         self.assertEqual(gp.call_count, 1)         # Check group object was constructed
-        gp.return_value.assert_called_once_with()  # Check group object was called
+        gp.return_value.apply_async.assert_called_once_with()  # Check group was dispatched
+
+    def test_subtask_results_ignored(self: AllTaskTestCaseBase):
+        """Test that the subtask signatures are set to ignore their results."""
+        self.call_task()
+        subtask = self.get_callable('subtask')
+        self.assertIs(subtask.return_value.set.call_args[1]['ignore_result'], True)
+        self.assertEqual(subtask.return_value.set.call_count, subtask.call_count)
+
+    def test_fetches_pks_in_one_query(self: AllTaskTestCaseBase):
+        """Test that the primary keys are fetched using a single database query."""
+        with self.assertNumQueries(1):
+            self.call_task()
 
 
 class TestOkWithoutActiveExperimentMixin(object):
@@ -143,7 +155,7 @@ class TestOkWithoutActiveExperimentMixin(object):
             self.call_task()
 
             gp = self.get_callable('group')
-            gp.return_value.assert_not_called()
+            gp.return_value.apply_async.assert_not_called()
 
             mock_logger.exception.assert_not_called()
 
@@ -231,6 +243,12 @@ class EccServerRefreshAllTaskTestCase(ExceptionHandlingTestMixin, TestCalledForA
     def call_task(self):
         return eccserver_refresh_all_task()
 
+    def test_subtasks_expire(self):
+        """Test that the subtasks expire if they aren't started before the next refresh."""
+        self.call_task()
+        subtask = self.get_callable('subtask')
+        subtask.return_value.set.assert_called_with(ignore_result=True, expires=REFRESH_STATE_EXPIRES)
+
     def get_queryset(self):
         return ECCServer.objects.filter(experiment=self.experiment)
 
@@ -367,14 +385,8 @@ class CheckDataRouterStatusTaskTestCase(ExceptionHandlingTestMixin, TaskTestCase
     def get_patch_target(self):
         return 'attpcdaq.daq.tasks.WorkerInterface'
 
-    def get_callable(self, which='status'):
-        cm = self.mock.return_value.__enter__.return_value
-        if which == 'status':
-            return cm.check_data_router_status
-        elif which == 'clean':
-            return cm.working_dir_is_clean
-        else:
-            raise ValueError('Unknown method {} requested'.format(which))
+    def get_callable(self):
+        return self.mock.return_value.__enter__.return_value.probe_router_status
 
     def call_task(self, pk=None):
         if pk is None:
@@ -387,14 +399,12 @@ class CheckDataRouterStatusTaskTestCase(ExceptionHandlingTestMixin, TaskTestCase
         self.data_router.staging_directory_is_clean = False
         self.data_router.save()
 
-        self.set_mock_effect(True, which='status')
-        self.set_mock_effect(True, which='clean')
+        self.set_mock_effect((True, True))
 
         self.call_task()
 
         self.mock.assert_called_once_with(self.data_router.ip_address)
-        self.get_callable(which='status').assert_called_once_with()
-        self.get_callable(which='clean').assert_called_once_with()
+        self.get_callable().assert_called_once_with()
 
         self.data_router.refresh_from_db()
         self.assertTrue(self.data_router.is_online)
@@ -405,14 +415,21 @@ class CheckDataRouterStatusTaskTestCase(ExceptionHandlingTestMixin, TaskTestCase
         with self.assertLogs(level=logging.ERROR):
             self.call_task(self.data_router.pk + 10)
 
-    def test_does_not_check_if_clean_if_not_online(self):
-        """Test that the staging directory status is not checked if the server is not online."""
-        self.set_mock_effect(False, which='status')
+    def test_clean_status_unchanged_if_not_online(self):
+        """Test that the staging directory status is not changed if the server is not online."""
+        self.data_router.is_online = True
+        self.data_router.staging_directory_is_clean = False
+        self.data_router.save()
+
+        self.set_mock_effect((False, None))
         self.call_task()
 
         self.mock.assert_called_once_with(self.data_router.ip_address)
-        self.get_callable(which='status').assert_called_once_with()
-        self.get_callable(which='clean').assert_not_called()
+        self.get_callable().assert_called_once_with()
+
+        self.data_router.refresh_from_db()
+        self.assertFalse(self.data_router.is_online)
+        self.assertFalse(self.data_router.staging_directory_is_clean)
 
 
 class CheckDataRouterStatusAllTaskTestCase(ExceptionHandlingTestMixin, TestCalledForAllMixin,
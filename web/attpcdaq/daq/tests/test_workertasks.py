@@ -1,10 +1,18 @@
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, call
 import os
-from itertools import chain
+from itertools import chain, product
 from io import BytesIO
+import socket
+from paramiko.ssh_exception import SSHException
 
-from ..workertasks import WorkerInterface, mkdir_recursive
+from ..workertasks import WorkerInterface, mkdir_recursive, close_cached_clients, SSH_TIMEOUT
+from ..workertasks import _ROUTER_PROBE_COMMAND, _load_ssh_config, _client_cache, discard_client
+
+
+def make_stdout(lines):
+    """Make a fake stdout stream for a remote command that prints the given lines."""
+    return BytesIO(''.join(lines).encode('utf-8'))
 
 
 class MkdirRecursiveTestCase(TestCase):
@@ -102,23 +110,46 @@ class WorkerInterfaceTestCase(TestCase):
         self.router_path = '/path/to/router'
         self.graw_list = ['test1.graw', 'test2.graw']
 
+        cache_patcher = patch.dict('attpcdaq.daq.workertasks._client_cache', clear=True)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        _load_ssh_config.cache_clear()
+        self.addCleanup(_load_ssh_config.cache_clear)
+
     def test_initialize_loads_host_keys(self, mock_client, mock_config):
         wint = WorkerInterface(self.hostname)
         client = mock_client.return_value
         client.load_system_host_keys.assert_called_once_with()
 
+    @patch('attpcdaq.daq.workertasks.os.stat')
     @patch('attpcdaq.daq.workertasks.open')
-    def test_initialize_finds_default_ssh_config_path(self, mock_open, mock_client, mock_config):
+    def test_initialize_finds_default_ssh_config_path(self, mock_open, mock_stat, mock_client, mock_config):
         wint = WorkerInterface(self.hostname)
         exp_path = os.path.expanduser('~/.ssh/config')
         mock_open.assert_called_once_with(exp_path)
 
+    @patch('attpcdaq.daq.workertasks.os.stat')
     @patch('attpcdaq.daq.workertasks.open')
-    def test_initialize_with_config_path(self, mock_open, mock_client, mock_config):
+    def test_initialize_with_config_path(self, mock_open, mock_stat, mock_client, mock_config):
         path = '/path/to/file'
         wint = WorkerInterface(self.hostname, config_path=path)
         mock_open.assert_called_once_with(path)
 
+    @patch('attpcdaq.daq.workertasks.os.stat')
+    @patch('attpcdaq.daq.workertasks.open')
+    def test_ssh_config_is_cached(self, mock_open, mock_stat, mock_client, mock_config):
+        path = '/path/to/file'
+        mock_stat.return_value.st_mtime = 1.0
+
+        WorkerInterface(self.hostname, config_path=path)
+        WorkerInterface(self.hostname, config_path=path)
+        mock_open.assert_called_once_with(path)
+
+        mock_stat.return_value.st_mtime = 2.0
+        WorkerInterface(self.hostname, config_path=path)
+        self.assertEqual(mock_open.call_count, 2)
+
     def test_hostname_lookup(self, mock_client, mock_config):
         mock_host_cfg = MagicMock(spec=dict)
         mock_host_cfg.get.side_effect = {'hostname': self.full_hostname,
@@ -134,21 +165,98 @@ class WorkerInterfaceTestCase(TestCase):
         self.assertEqual(mock_host_cfg.get.call_args_list, expected_get_calls)
 
         client = mock_client.return_value
-        client.connect.assert_called_once_with(self.full_hostname, 22, username=self.user)
+        client.connect.assert_called_once_with(self.full_hostname, 22, username=self.user, timeout=SSH_TIMEOUT)
 
-    def test_exit_closes_connection(self, mock_client, mock_config):
+    def test_exit_keeps_connection_open(self, mock_client, mock_config):
         client = mock_client.return_value
 
         with WorkerInterface(self.hostname) as wint:
             pass
 
+        client.close.assert_not_called()
+
+    def _exit_with_connection_error_impl(self, mock_client, exc_type):
+        client = mock_client.return_value
+
+        with self.assertRaises(exc_type):
+            with WorkerInterface(self.hostname) as wint:
+                raise exc_type()
+
+        client.close.assert_called_once_with()
+
+        WorkerInterface(self.hostname)
+        self.assertEqual(client.connect.call_count, 2)
+
+    def test_exit_with_ssh_exception_closes_connection(self, mock_client, mock_config):
+        self._exit_with_connection_error_impl(mock_client, SSHException)
+
+    def test_exit_with_timeout_closes_connection(self, mock_client, mock_config):
+        self._exit_with_connection_error_impl(mock_client, socket.timeout)
+
+    def test_exit_with_other_exception_keeps_connection(self, mock_client, mock_config):
+        client = mock_client.return_value
+
+        with self.assertRaises(RuntimeError):
+            with WorkerInterface(self.hostname) as wint:
+                raise RuntimeError("lsof didn't find dataRouter")
+
+        client.close.assert_not_called()
+
+        WorkerInterface(self.hostname)
+        client.connect.assert_called_once_with(self.hostname, 22, username=None, timeout=SSH_TIMEOUT)
+
+    def test_connection_is_reused(self, mock_client, mock_config):
+        client = mock_client.return_value
+
+        with WorkerInterface(self.hostname) as wint1:
+            pass
+
+        with WorkerInterface(self.hostname) as wint2:
+            pass
+
+        self.assertIs(wint1.client, wint2.client)
+        client.connect.assert_called_once_with(self.hostname, 22, username=None, timeout=SSH_TIMEOUT)
+
+    def test_dead_connection_is_replaced(self, mock_client, mock_config):
+        client = mock_client.return_value
+
+        with WorkerInterface(self.hostname) as wint:
+            pass
+
+        client.get_transport.return_value.is_active.return_value = False
+
+        with WorkerInterface(self.hostname) as wint:
+            pass
+
+        client.close.assert_called_once_with()
+        self.assertEqual(client.connect.call_count, 2)
+
+    def test_discard_client_keeps_newer_connection(self, mock_client, mock_config):
+        # Another thread has already replaced the dead client with a new one
+        dead_client, new_client = MagicMock(), MagicMock()
+        _client_cache[(self.hostname, 22, None)] = new_client
+
+        discard_client(self.hostname, client=dead_client)
+
+        dead_client.close.assert_called_once_with()
+        new_client.close.assert_not_called()
+        self.assertIs(_client_cache[(self.hostname, 22, None)], new_client)
+
+    def test_close_cached_clients(self, mock_client, mock_config):
+        client = mock_client.return_value
+
+        with WorkerInterface(self.hostname) as wint:
+            pass
+
+        close_cached_clients()
+
         client.close.assert_called_once_with()
 
     def test_find_data_router(self, mock_client, mock_config):
         true_drpath = '/path/to/router'
         client = mock_client.return_value
         fake_lsof_return = ('p1234\n', 'cdataRouter\n', 'n{}\n'.format(true_drpath))
-        client.exec_command.return_value = ([], fake_lsof_return, [])
+        client.exec_command.return_value = ([], make_stdout(fake_lsof_return), [])
 
         with WorkerInterface(self.hostname) as wint:
             drpath = wint.find_data_router()
@@ -157,7 +265,7 @@ class WorkerInterfaceTestCase(TestCase):
 
     def test_find_data_router_not_running(self, mock_client, mock_config):
         client = mock_client.return_value
-        client.exec_command.return_value = ([], [], [])
+        client.exec_command.return_value = ([], make_stdout([]), [])
 
         with WorkerInterface(self.hostname) as wint:
             self.assertRaisesRegex(RuntimeError, r"lsof didn't find dataRouter",
@@ -167,24 +275,16 @@ class WorkerInterfaceTestCase(TestCase):
         client = mock_client.return_value
 
         fake_lsof_return = ('p1234\n', 'csomeProgram\n', 'n/some/path\n')
-        client.exec_command.return_value = ([], fake_lsof_return, [])
+        client.exec_command.return_value = ([], make_stdout(fake_lsof_return), [])
 
         with WorkerInterface(self.hostname) as wint:
             self.assertRaisesRegex(RuntimeError, r"lsof found .* instead of dataRouter",
                                    wint.find_data_router)
 
-    def _check_process_impl(self, client, ecc_server_running=True, data_router_running=True):
-        if ecc_server_running:
-            ecc_line = ' 1234 ??         0:01.23 /path/to/getEccSoapServer --args something\n'
-        else:
-            ecc_line = ''
-
-        if data_router_running:
-            data_router_line = ' 1235 ??         0:03.45 /path/to/dataRouter --args 123.345.567.789\n'
-        else:
-            data_router_line = ''
-
-        client.exec_command.return_value = ([], (ecc_line, data_router_line), [])
+    def _check_process_impl(self, mock_client, ecc_server_running, data_router_running):
+        client = mock_client.return_value
+        statuses = ('0\n' if ecc_server_running else '1\n', '0\n' if data_router_running else '1\n')
+        client.exec_command.return_value = ([], make_stdout(statuses), [])
 
         with WorkerInterface(self.hostname) as wint:
             ecc_server_running_res, data_router_running_res = wint.check_process_status()
@@ -192,19 +292,33 @@ class WorkerInterfaceTestCase(TestCase):
         self.assertIs(ecc_server_running_res, ecc_server_running)
         self.assertIs(data_router_running_res, data_router_running)
 
-    def _check_ecc_running_impl(self, mock_client, is_running):
-        if is_running:
-            ecc_line = ' 1234 ??         0:01.23 /path/to/getEccSoapServer --args something\n'
-        else:
-            ecc_line = ''
+        expected_command = "pgrep -f '[g]etEccSoapServer' > /dev/null; echo $?; " \
+                           "pgrep -f '[d]ataRouter' > /dev/null; echo $?"
+        client.exec_command.assert_called_once_with(expected_command, timeout=SSH_TIMEOUT)
+
+    def test_check_process_status(self, mock_client, mock_config):
+        for ecc_server_running, data_router_running in product([True, False], repeat=2):
+            with self.subTest(ecc_server_running=ecc_server_running, data_router_running=data_router_running):
+                mock_client.reset_mock()
+                self._check_process_impl(mock_client, ecc_server_running, data_router_running)
+
+    def test_check_process_status_pgrep_error(self, mock_client, mock_config):
+        client = mock_client.return_value
+        client.exec_command.return_value = ([], make_stdout(('2\n', '0\n')), [])
+
+        with WorkerInterface(self.hostname) as wint:
+            self.assertRaisesRegex(RuntimeError, r'pgrep failed', wint.check_process_status)
 
+    def _check_ecc_running_impl(self, mock_client, is_running):
         client = mock_client.return_value
-        client.exec_command.return_value = ([], (ecc_line,), [])
+        client.exec_command.return_value = ([], make_stdout(('0\n' if is_running else '1\n',)), [])
 
         with WorkerInterface(self.hostname) as wint:
             ecc_server_running_res = wint.check_ecc_server_status()
 
         self.assertIs(ecc_server_running_res, is_running)
+        client.exec_command.assert_called_once_with("pgrep -f '[g]etEccSoapServer' > /dev/null; echo $?",
+                                                    timeout=SSH_TIMEOUT)
 
     def test_check_ecc_running_when_true(self, mock_client, mock_config):
         self._check_ecc_running_impl(mock_client, True)
@@ -213,18 +327,15 @@ class WorkerInterfaceTestCase(TestCase):
         self._check_ecc_running_impl(mock_client, False)
 
     def _check_data_router_running_impl(self, mock_client, is_running):
-        if is_running:
-            dr_line = ' 1234 ??         0:01.23 /path/to/dataRouter --args something\n'
-        else:
-            dr_line = ''
-
         client = mock_client.return_value
-        client.exec_command.return_value = ([], [dr_line], [])
+        client.exec_command.return_value = ([], make_stdout(['0\n' if is_running else '1\n']), [])
 
         with WorkerInterface(self.hostname) as wint:
             dr_status_result = wint.check_data_router_status()
 
         self.assertIs(dr_status_result, is_running)
+        client.exec_command.assert_called_once_with("pgrep -f '[d]ataRouter' > /dev/null; echo $?",
+                                                    timeout=SSH_TIMEOUT)
 
     def test_check_data_router_running_when_true(self, mock_client, mock_config):
         self._check_data_router_running_impl(mock_client, True)
@@ -232,77 +343,169 @@ class WorkerInterfaceTestCase(TestCase):
     def test_check_data_router_running_when_false(self, mock_client, mock_config):
         self._check_data_router_running_impl(mock_client, False)
 
+    def _probe_router_impl(self, mock_client, pgrep_lines, lsof_lines, graw_lines):
+        sep = '--attpcdaq-probe--\n'
+        output = pgrep_lines + [sep] + lsof_lines + [sep] + graw_lines
+
+        client = mock_client.return_value
+        client.exec_command.return_value = ([], make_stdout(output), [])
+
+        with WorkerInterface(self.hostname) as wint:
+            result = wint.probe_router_status()
+
+        client.exec_command.assert_called_once_with(_ROUTER_PROBE_COMMAND, timeout=SSH_TIMEOUT)
+        return result
+
+    def test_probe_router_command_does_not_match_itself(self, mock_client, mock_config):
+        # pgrep -f would match the shell running the command if it contained the bare process name
+        self.assertNotIn('dataRouter', _ROUTER_PROBE_COMMAND)
+
+    def test_probe_router_status_clean(self, mock_client, mock_config):
+        pgrep_lines = ['0\n']
+        lsof_lines = ['p1234\n', 'cdataRouter\n', 'n{}\n'.format(self.router_path)]
+        graw_lines = []
+
+        result = self._probe_router_impl(mock_client, pgrep_lines, lsof_lines, graw_lines)
+        self.assertEqual(result, (True, True))
+
+    def test_probe_router_status_dirty(self, mock_client, mock_config):
+        pgrep_lines = ['0\n']
+        lsof_lines = ['p1234\n', 'cdataRouter\n', 'n{}\n'.format(self.router_path)]
+        graw_lines = [os.path.join(self.router_path, g) + '\n' for g in self.graw_list]
+
+        result = self._probe_router_impl(mock_client, pgrep_lines, lsof_lines, graw_lines)
+        self.assertEqual(result, (True, False))
+
+    def test_probe_router_status_not_running(self, mock_client, mock_config):
+        pgrep_lines = ['1\n']
+
+        result = self._probe_router_impl(mock_client, pgrep_lines, [], [])
+        self.assertEqual(result, (False, None))
+
+    def test_probe_router_status_no_working_dir(self, mock_client, mock_config):
+        pgrep_lines = ['0\n']
+
+        with self.assertRaisesRegex(RuntimeError, r"lsof didn't find dataRouter"):
+            self._probe_router_impl(mock_client, pgrep_lines, [], [])
+
+    def test_find_data_router_is_cached(self, mock_client, mock_config):
+        true_drpath = '/path/to/router'
+        client = mock_client.return_value
+        fake_lsof_return = ('p1234\n', 'cdataRouter\n', 'n{}\n'.format(true_drpath))
+        client.exec_command.return_value = ([], make_stdout(fake_lsof_return), [])
+
+        with WorkerInterface(self.hostname) as wint:
+            first = wint.find_data_router()
+            second = wint.find_data_router()
+
+        self.assertEqual(first, true_drpath)
+        self.assertEqual(second, true_drpath)
+        client.exec_command.assert_called_once_with('lsof -a -d cwd -c dataRouter -Fcn', timeout=SSH_TIMEOUT)
+
     @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
     def test_get_graw_list(self, mock_find_data_router, mock_client, mock_config):
-        mock_open_sftp = mock_client.return_value.open_sftp
-        mock_sftp = mock_open_sftp.return_value.__enter__.return_value
-
+        client = mock_client.return_value
         mock_find_data_router.return_value = self.router_path
 
-        file_list = ['file1.graw', 'file2.graw', 'file3.graw', 'file4.txt', 'file5.html']
-        mock_sftp.listdir.return_value = file_list
+        full_paths = [os.path.join(self.router_path, f) for f in ['file1.graw', 'file2.graw', 'file3.graw']]
+        find_output = BytesIO(''.join(p + '\0' for p in full_paths).encode('utf-8'))
+        client.exec_command.return_value = ([], find_output, [])
 
         with WorkerInterface(self.hostname) as wint:
             result = wint.get_graw_list()
 
         mock_find_data_router.assert_called_once_with()
-        mock_open_sftp.assert_called_once_with()
-        mock_sftp.listdir.assert_called_once_with(self.router_path)
+        client.exec_command.assert_called_once_with(
+            'find {} -maxdepth 1 -name "*.graw" -print0'.format(self.router_path), timeout=SSH_TIMEOUT)
+        client.open_sftp.assert_not_called()
 
-        expect = [os.path.join(self.router_path, f) for f in file_list[:3]]
-        self.assertEqual(result, expect)
+        self.assertEqual(result, full_paths)
 
-    @patch('attpcdaq.daq.workertasks.mkdir_recursive')
-    @patch('attpcdaq.daq.workertasks.WorkerInterface.get_graw_list')
     @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
-    def test_organize_files(self, mock_find_data_router, mock_get_graw_list, mock_mkdir, mock_client, mock_config):
-        # Shortcuts to mocks
-        mock_sftp = mock_client.return_value.open_sftp.return_value.__enter__.return_value
+    def test_get_graw_list_when_empty(self, mock_find_data_router, mock_client, mock_config):
+        client = mock_client.return_value
+        mock_find_data_router.return_value = self.router_path
+        client.exec_command.return_value = ([], BytesIO(b''), [])
+
+        with WorkerInterface(self.hostname) as wint:
+            result = wint.get_graw_list()
+
+        self.assertEqual(result, [])
 
-        # Experiment info
-        exp_name = 'experiment name'
-        run_number = 1
+    def _organize_files_impl(self, mock_client, graws, exit_status=0):
+        mock_stdin, mock_stdout, mock_stderr = MagicMock(), MagicMock(), MagicMock()
+        mock_stdout.channel.status_event.wait.return_value = True
+        mock_stdout.channel.recv_exit_status.return_value = exit_status
+        mock_stderr.read.return_value = b'Something happened'
+
+        client = mock_client.return_value
+        client.exec_command.return_value = (mock_stdin, mock_stdout, mock_stderr)
 
-        # Build file paths
+        with WorkerInterface(self.hostname) as wint:
+            wint.organize_files('experiment name', 1)
+
+        return client, mock_stdin
+
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.get_graw_list')
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
+    def test_organize_files(self, mock_find_data_router, mock_get_graw_list, mock_client, mock_config):
         full_src_graws = [os.path.join(self.router_path, g) for g in self.graw_list]
-        dest_dir = os.path.join(self.router_path, exp_name, 'run_{:04d}'.format(run_number))
-        full_dest_graws = [os.path.join(dest_dir, g) for g in self.graw_list]
+        dest_dir = os.path.join(self.router_path, 'experiment name', 'run_0001')
 
-        # Set side effects
         mock_find_data_router.return_value = self.router_path
         mock_get_graw_list.return_value = full_src_graws
 
-        # Call method
-        with WorkerInterface(self.hostname) as wint:
-            wint.organize_files(exp_name, run_number)
+        client, mock_stdin = self._organize_files_impl(mock_client, full_src_graws)
 
-        # Check calls
         mock_find_data_router.assert_called_once_with()
         mock_get_graw_list.assert_called_once_with()
 
-        expected_calls = [call(s, d) for s, d in zip(full_src_graws, full_dest_graws)]
-        self.assertEqual(mock_sftp.rename.call_args_list, expected_calls)
+        expected_command = """mkdir -p '{0}' && xargs -0 sh -c 'mv -- "$@" "$0"' '{0}'""".format(dest_dir)
+        client.exec_command.assert_called_once_with(expected_command, timeout=SSH_TIMEOUT)
+
+        expected_stdin = ''.join(g + '\0' for g in full_src_graws).encode('utf-8')
+        mock_stdin.write.assert_called_once_with(expected_stdin)
+        mock_stdin.channel.shutdown_write.assert_called_once_with()
 
-    @patch('attpcdaq.daq.workertasks.mkdir_recursive')
     @patch('attpcdaq.daq.workertasks.WorkerInterface.get_graw_list')
     @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
-    def test_organize_files_failure(self, mock_find_data_router, mock_get_graw_list, mock_mkdir, mock_client, mock_config):
-        # Shortcuts to mocks
-        mock_sftp = mock_client.return_value.open_sftp.return_value.__enter__.return_value
+    def test_organize_files_with_no_files(self, mock_find_data_router, mock_get_graw_list, mock_client, mock_config):
+        dest_dir = os.path.join(self.router_path, 'experiment name', 'run_0001')
+
+        mock_find_data_router.return_value = self.router_path
+        mock_get_graw_list.return_value = []
 
-        # Experiment info
-        exp_name = 'experiment name'
-        run_number = 1
+        client, mock_stdin = self._organize_files_impl(mock_client, [])
 
-        # Set side effects
+        client.exec_command.assert_called_once_with("mkdir -p '{}'".format(dest_dir), timeout=SSH_TIMEOUT)
+
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.get_graw_list')
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
+    def test_organize_files_failure(self, mock_find_data_router, mock_get_graw_list, mock_client, mock_config):
         mock_get_graw_list.return_value = self.graw_list  # Not full paths, but that's not important here
-        mock_sftp.rename.side_effect = FileNotFoundError('Something happened')
         mock_find_data_router.return_value = self.router_path
 
-        # Call method
-        with self.assertRaises(FileNotFoundError):
+        with self.assertRaisesRegex(RuntimeError, r'exit status 1.*Something happened'):
+            self._organize_files_impl(mock_client, self.graw_list, exit_status=1)
+
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.get_graw_list')
+    @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
+    def test_organize_files_timeout(self, mock_find_data_router, mock_get_graw_list, mock_client, mock_config):
+        mock_get_graw_list.return_value = self.graw_list
+        mock_find_data_router.return_value = self.router_path
+        mock_channel = MagicMock()
+        mock_channel.status_event.wait.return_value = False  # The command never finishes
+
+        client = mock_client.return_value
+        client.exec_command.return_value = (MagicMock(), MagicMock(channel=mock_channel), MagicMock())
+
+        with self.assertRaisesRegex(RuntimeError, r'Timed out'):
             with WorkerInterface(self.hostname) as wint:
-                wint.organize_files(exp_name, run_number)
+                wint.organize_files('experiment name', 1)
+
+        mock_channel.status_event.wait.assert_called_once_with(SSH_TIMEOUT)
+        mock_channel.recv_exit_status.assert_not_called()
+        mock_channel.close.assert_called_once_with()
 
     @patch('attpcdaq.daq.workertasks.WorkerInterface.find_data_router')
     def test_build_run_dir_path(self, mock_find_data_router, mock_client, mock_config):
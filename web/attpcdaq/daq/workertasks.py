@@ -3,14 +3,179 @@
 This module uses the Paramiko SSH library to connect to the nodes running the data router to,
 for example, organize files at the end of a run.
 
+SSH connections are cached per process and reused by later tasks, since making a new connection requires a
+full TCP and SSH handshake with the remote host.
+
 """
 
 from paramiko.client import SSHClient
 from paramiko.config import SSHConfig
 from paramiko.sftp_file import SFTPFile
+from paramiko.ssh_exception import SSHException
 from paramiko import AutoAddPolicy
+from celery.signals import worker_process_shutdown
+import functools
 import os
-import re
+import shlex
+import threading
+
+#: Timeout, in seconds, for connecting to a remote host and for each read from a remote command. Celery's
+#: soft time limits are not enforced in the thread pool that runs the remote tasks, so this is what keeps an
+#: unresponsive host from tying up a worker thread indefinitely.
+SSH_TIMEOUT = 10
+
+#: Connected SSH clients, keyed by ``(hostname, port, username)``
+_client_cache = {}
+
+#: Guards access to :data:`_client_cache`
+_client_cache_lock = threading.Lock()
+
+#: Exceptions that mean an SSH connection is broken, rather than that a remote command failed. Note that
+#: :class:`socket.timeout` is a subclass of :class:`OSError`.
+_CONNECTION_ERRORS = (SSHException, EOFError, OSError)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_ssh_config(path, mtime):
+    """Parse the SSH config file at the given path.
+
+    The result is cached, so the file is only read again if its modification time changes.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SSH config file.
+    mtime : float
+        The modification time of the file. This is only used as part of the cache key.
+
+    Returns
+    -------
+    paramiko.config.SSHConfig
+        The parsed config. This is shared between callers, so it should not be modified.
+
+    """
+    config = SSHConfig()
+    with open(path) as config_file:
+        config.parse(config_file)
+    return config
+
+
+def _client_is_alive(client):
+    """Check if a cached SSH client is still connected to the remote host.
+
+    Parameters
+    ----------
+    client : paramiko.client.SSHClient
+        The client to check.
+
+    Returns
+    -------
+    bool
+        True if the connection is still usable.
+
+    """
+    transport = client.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+
+    try:
+        transport.send_ignore()
+    except _CONNECTION_ERRORS:
+        return False
+    else:
+        return True
+
+
+def get_client(hostname, port=22, username=None):
+    """Get a connected SSH client for the given host, reusing a cached connection if possible.
+
+    If a cached connection exists but is no longer alive, it is closed and replaced with a new one.
+
+    Parameters
+    ----------
+    hostname : str
+        The full hostname to connect to. This should already have been looked up in the SSH config file.
+    port : int, optional
+        The port that the SSH server is listening on.
+    username : str, optional
+        The username to use. If None, the name of the user running the code will be used.
+
+    Returns
+    -------
+    paramiko.client.SSHClient
+        The connected client.
+
+    """
+    key = (hostname, port, username)
+
+    with _client_cache_lock:
+        client = _client_cache.get(key)
+
+    if client is not None:
+        if _client_is_alive(client):
+            return client
+        discard_client(hostname, port, username, client=client)
+
+    client = SSHClient()
+    client.load_system_host_keys()
+    client.set_missing_host_key_policy(AutoAddPolicy())
+    client.connect(hostname, port, username=username, timeout=SSH_TIMEOUT)
+
+    with _client_cache_lock:
+        cached = _client_cache.setdefault(key, client)
+
+    if cached is not client:
+        # Another thread connected to the same host first, so use its connection instead.
+        client.close()
+
+    return cached
+
+
+def discard_client(hostname, port=22, username=None, client=None):
+    """Close the cached SSH client for the given host, if there is one.
+
+    If ``client`` is given, it is closed, but it is only removed from the cache if it is still the cached
+    client for the host. This keeps a thread that found a broken connection from closing a new one that
+    another thread has connected and cached in the meantime.
+
+    Parameters
+    ----------
+    hostname : str
+        The full hostname of the remote host.
+    port : int, optional
+        The port that the SSH server is listening on.
+    username : str, optional
+        The username used for the connection.
+    client : paramiko.client.SSHClient, optional
+        The broken client to discard. If None, whatever client is cached for the host is discarded.
+
+    """
+    key = (hostname, port, username)
+
+    with _client_cache_lock:
+        if client is None:
+            client = _client_cache.pop(key, None)
+        elif _client_cache.get(key) is client:
+            del _client_cache[key]
+
+    if client is not None:
+        client.close()
+
+
+@worker_process_shutdown.connect
+def close_cached_clients(**kwargs):
+    """Close all cached SSH clients.
+
+    This is connected to Celery's ``worker_process_shutdown`` signal so the connections are closed
+    cleanly when a worker process exits.
+
+    """
+    with _client_cache_lock:
+        clients = list(_client_cache.values())
+        _client_cache.clear()
+
+    for client in clients:
+        client.close()
 
 
 def mkdir_recursive(sftp, path):
@@ -51,6 +216,147 @@ def mkdir_recursive(sftp, path):
         return
 
 
+def _parse_data_router_cwd(lsof_lines):
+    """Parse the data router's working directory out of the output of ``lsof -a -d cwd -c dataRouter -Fcn``.
+
+    Parameters
+    ----------
+    lsof_lines : iterable of str
+        The lines of output from ``lsof``.
+
+    Returns
+    -------
+    str
+        The directory where the data router is running.
+
+    Raises
+    ------
+    RuntimeError
+        If ``lsof`` found something strange instead of a process called ``dataRouter``, or if it found nothing.
+
+    """
+    for line in lsof_lines:
+        if line.startswith('c') and not line.startswith('cdataRouter'):
+            raise RuntimeError("lsof found {} instead of dataRouter".format(line[1:].strip()))
+        elif line.startswith('n'):
+            return line[1:].strip()
+    else:
+        raise RuntimeError("lsof didn't find dataRouter")
+
+
+def _pgrep_command(process_name):
+    """Build a shell command that prints 0 if the given process is running, or 1 if it isn't.
+
+    The first letter of the pattern is put in brackets so that the shell running the command, whose own
+    command line contains the pattern, does not match it.
+
+    Parameters
+    ----------
+    process_name : str
+        The name of the process to look for.
+
+    Returns
+    -------
+    str
+        The shell command.
+
+    """
+    pattern = '[{}]{}'.format(process_name[0], process_name[1:])
+    return 'pgrep -f {} > /dev/null; echo $?'.format(shlex.quote(pattern))
+
+
+def _parse_pgrep_status(line):
+    """Interpret a line of output from a command built by :func:`_pgrep_command`.
+
+    Parameters
+    ----------
+    line : str
+        The exit status of ``pgrep``, as printed by the command.
+
+    Returns
+    -------
+    bool
+        True if the process was running.
+
+    Raises
+    ------
+    RuntimeError
+        If ``pgrep`` itself failed.
+
+    """
+    status = int(line)
+    if status not in (0, 1):
+        raise RuntimeError('pgrep failed with exit status {}'.format(status))
+    return status == 0
+
+
+def _read_lines(stdout):
+    """Read all of a remote command's output at once and split it into lines.
+
+    This is much faster than iterating over the channel line by line, which makes a separate read
+    for each line.
+
+    Parameters
+    ----------
+    stdout : paramiko.channel.ChannelFile
+        The command's standard output.
+
+    Returns
+    -------
+    list[str]
+        The lines of output, without line endings.
+
+    """
+    return stdout.read().decode('utf-8', 'replace').splitlines()
+
+
+def _split_sections(lines, separator):
+    """Split the output of a compound shell command into sections.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The lines of output.
+    separator : str
+        The line that was echoed between the commands.
+
+    Returns
+    -------
+    list[list[str]]
+        The lines of each section.
+
+    """
+    sections = [[]]
+    for line in lines:
+        if line == separator:
+            sections.append([])
+        else:
+            sections[-1].append(line)
+
+    return sections
+
+
+#: Echoed between the parts of :data:`_ROUTER_PROBE_COMMAND` so its output can be split up again
+_PROBE_SEPARATOR = '--attpcdaq-probe--'
+
+#: Checks if the data router is running, and finds its working directory and the GRAW files in that
+#: directory, using a single remote command. The files are found with ``find``, as in
+#: :meth:`WorkerInterface.get_graw_list`, so the full directory listing isn't sent back.
+#:
+#: ``pgrep -f`` matches against full command lines, including that of the shell running this command, so
+#: the name ``dataRouter`` must not appear in it unbracketed. This is why ``lsof`` is given the regular
+#: expression ``/^[d]ataRouter/`` instead of the plain name.
+_ROUTER_PROBE_COMMAND = (
+    '{pgrep}; '
+    'echo {sep}; '
+    'info=$(lsof -a -d cwd -c \'/^[d]ataRouter/\' -Fcn); '
+    'echo "$info"; '
+    'echo {sep}; '
+    'dir=$(echo "$info" | sed -n "s/^n//p" | head -n 1); '
+    'if [ -n "$dir" ]; then find "$dir" -maxdepth 1 -name "*.graw"; fi'
+).format(pgrep=_pgrep_command('dataRouter'), sep=_PROBE_SEPARATOR)
+
+
 class WorkerInterface(object):
     """An interface to perform tasks on the DAQ worker nodes.
 
@@ -61,6 +367,11 @@ class WorkerInterface(object):
     Additionally, the server *must* accept connections authenticated using a public key, and this public key must
     be available in your ``.ssh`` directory.
 
+    The underlying SSH connection is taken from a per-process cache (see :func:`get_client`), so it stays open
+    after the ``with`` block exits and is reused by the next interface made for the same host. If the block
+    raises an exception that indicates a broken connection (e.g. an SSH error or a timeout), the connection is
+    closed and removed from the cache. Other errors, like a failed remote command, leave it cached.
+
     Parameters
     ----------
     hostname : str
@@ -76,16 +387,11 @@ class WorkerInterface(object):
     """
     def __init__(self, hostname, port=22, username=None, config_path=None):
         self.hostname = hostname
-        self.client = SSHClient()
-
-        self.client.load_system_host_keys()
-        self.client.set_missing_host_key_policy(AutoAddPolicy())
+        self._data_router_dir = None
 
         if config_path is None:
             config_path = os.path.join(os.path.expanduser('~'), '.ssh', 'config')
-        self.config = SSHConfig()
-        with open(config_path) as config_file:
-            self.config.parse(config_file)
+        self.config = _load_ssh_config(config_path, os.stat(config_path).st_mtime)
 
         if hostname in self.config.get_hostnames():
             host_cfg = self.config.lookup(hostname)
@@ -95,18 +401,21 @@ class WorkerInterface(object):
         else:
             full_hostname = hostname
 
-        self.client.connect(full_hostname, port, username=username)
+        self._connection_key = (full_hostname, port, username)
+        self.client = get_client(full_hostname, port, username)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.client.close()
+        if exc_type is not None and issubclass(exc_type, _CONNECTION_ERRORS):
+            discard_client(*self._connection_key, client=self.client)
 
     def find_data_router(self):
         """Find the working directory of the data router process.
 
-        The directory is found using ``lsof``, which must be available on the remote system.
+        The directory is found using ``lsof``, which must be available on the remote system. The result is
+        remembered, so ``lsof`` is only run the first time this is called on a given :class:`WorkerInterface`.
 
         Returns
         -------
@@ -119,14 +428,11 @@ class WorkerInterface(object):
             If ``lsof`` finds something strange instead of a process called ``dataRouter``.
 
         """
-        stdin, stdout, stderr = self.client.exec_command('lsof -a -d cwd -c dataRouter -Fcn')
-        for line in stdout:
-            if line[0] == 'c' and not re.match('cdataRouter', line):
-                raise RuntimeError("lsof found {} instead of dataRouter".format(line[1:].strip()))
-            elif line[0] == 'n':
-                return line[1:].strip()
-        else:
-            raise RuntimeError("lsof didn't find dataRouter")
+        if self._data_router_dir is None:
+            stdin, stdout, stderr = self.client.exec_command('lsof -a -d cwd -c dataRouter -Fcn', timeout=SSH_TIMEOUT)
+            self._data_router_dir = _parse_data_router_cwd(_read_lines(stdout))
+
+        return self._data_router_dir
 
     def get_graw_list(self):
         """Get a list of GRAW files in the data router's working directory.
@@ -139,13 +445,11 @@ class WorkerInterface(object):
         """
         data_dir = self.find_data_router()
 
-        with self.client.open_sftp() as sftp:
-            full_list = sftp.listdir(data_dir)
-
-        graws = filter(lambda s: re.match(r'.*\.graw$', s), full_list)
-        full_graw_paths = (os.path.join(data_dir, filename) for filename in graws)
+        command = 'find {} -maxdepth 1 -name "*.graw" -print0'.format(shlex.quote(data_dir))
+        _, stdout, _ = self.client.exec_command(command, timeout=SSH_TIMEOUT)
+        output = stdout.read().decode('utf-8')
 
-        return list(full_graw_paths)
+        return [path for path in output.split('\0') if path]
 
     def working_dir_is_clean(self):
         """Check if there are GRAW files in the data router's working directory.
@@ -157,27 +461,37 @@ class WorkerInterface(object):
         """
         return len(self.get_graw_list()) == 0
 
-    def _check_process_status(self, process_name):
-        """Checks if the given process is running.
+    def _check_process_status(self, *process_names):
+        """Checks if the given processes are running.
+
+        This uses ``pgrep``, so the matching is done on the remote host and only an exit status is sent back
+        for each process.
 
         Parameters
         ----------
-        process_name : str
-            The name of the process to look for
+        process_names : str
+            The names of the processes to look for. All of them are checked using one remote command.
 
         Returns
         -------
-        bool
-            True if the process is running.
+        list[bool]
+            True for each process that is running, in the order they were given.
         """
+        command = '; '.join(_pgrep_command(name) for name in process_names)
+        _, stdout, _ = self.client.exec_command(command, timeout=SSH_TIMEOUT)
 
-        _, stdout, _ = self.client.exec_command('ps -e')
+        return [_parse_pgrep_status(line) for line in _read_lines(stdout) if line.strip()]
 
-        for line in stdout:
-            if re.search(process_name, line):
-                return True
-        else:
-            return False
+    def check_process_status(self):
+        """Checks if the ECC server and the data router are running.
+
+        Returns
+        -------
+        ecc_server_running, data_router_running : bool
+            True if ``getEccSoapServer`` or ``dataRouter``, respectively, is running.
+        """
+        ecc_server_running, data_router_running = self._check_process_status('getEccSoapServer', 'dataRouter')
+        return ecc_server_running, data_router_running
 
     def check_ecc_server_status(self):
         """Checks if the ECC server is running.
@@ -187,7 +501,8 @@ class WorkerInterface(object):
         bool
             True if ``getEccSoapServer`` is running.
         """
-        return self._check_process_status(r'getEccSoapServer')
+        is_running, = self._check_process_status('getEccSoapServer')
+        return is_running
 
     def check_data_router_status(self):
         """Checks if the data router is running.
@@ -197,7 +512,40 @@ class WorkerInterface(object):
         bool
             True if ``dataRouter`` is running.
         """
-        return self._check_process_status(r'dataRouter')
+        is_running, = self._check_process_status('dataRouter')
+        return is_running
+
+    def probe_router_status(self):
+        """Check if the data router is running and if its working directory is clean.
+
+        This does the work of :meth:`check_data_router_status` and :meth:`working_dir_is_clean` using
+        a single remote command, so only one round-trip to the remote host is needed.
+
+        Returns
+        -------
+        is_running : bool
+            True if ``dataRouter`` is running.
+        is_clean : bool or None
+            True if there are no GRAW files in the data router's working directory. If the data router
+            is not running, this will be None.
+
+        Raises
+        ------
+        RuntimeError
+            If the data router is running but its working directory could not be found.
+
+        """
+        _, stdout, _ = self.client.exec_command(_ROUTER_PROBE_COMMAND, timeout=SSH_TIMEOUT)
+        pgrep_lines, lsof_lines, graw_lines = _split_sections(_read_lines(stdout), _PROBE_SEPARATOR)
+
+        is_running = _parse_pgrep_status(pgrep_lines[0])
+        if not is_running:
+            return False, None
+
+        _parse_data_router_cwd(lsof_lines)  # Raises if the working directory wasn't found
+        is_clean = not any(line.strip() for line in graw_lines)
+
+        return True, is_clean
 
     def build_run_dir_path(self, experiment_name, run_number):
         """Get the path to the directory for a given run.
@@ -230,6 +578,9 @@ class WorkerInterface(object):
         the directory ``./experiment_name/run_name``, which will be created if necessary. For example, if
         the ``experiment_name`` is "test" and the ``run_number`` is 4, the files will be placed in ``./test/run_0004``.
 
+        The directory is created and the files are moved using a single remote command. The list of files is sent
+        to ``xargs`` on the command's standard input, so it isn't limited by the maximum length of a command line.
+
         Parameters
         ----------
         experiment_name : str
@@ -237,17 +588,34 @@ class WorkerInterface(object):
         run_number : int
             The current run number.
 
+        Raises
+        ------
+        RuntimeError
+            If the remote command fails, or if it doesn't finish within :data:`SSH_TIMEOUT` seconds.
+
         """
         run_dir = self.build_run_dir_path(experiment_name, run_number)
 
         graws = self.get_graw_list()
 
-        with self.client.open_sftp() as sftp:
-            mkdir_recursive(sftp, run_dir)
-            for srcpath in graws:
-                _, srcfile = os.path.split(srcpath)
-                destpath = os.path.join(run_dir, srcfile)
-                sftp.rename(srcpath, destpath)
+        command = 'mkdir -p {}'.format(shlex.quote(run_dir))
+        if len(graws) > 0:
+            # Inside sh -c, $0 is the destination and $@ is the batch of files from xargs
+            command += ' && xargs -0 sh -c {} {}'.format(shlex.quote('mv -- "$@" "$0"'), shlex.quote(run_dir))
+
+        stdin, stdout, stderr = self.client.exec_command(command, timeout=SSH_TIMEOUT)
+        stdin.write(''.join(path + '\0' for path in graws).encode('utf-8'))
+        stdin.channel.shutdown_write()
+
+        # The channel timeout doesn't apply to waiting for the exit status, so give that its own deadline
+        if not stdout.channel.status_event.wait(SSH_TIMEOUT):
+            stdout.channel.close()
+            raise RuntimeError('Timed out waiting for files to be organized on {}'.format(self.hostname))
+
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status != 0:
+            message = stderr.read().decode('utf-8', 'replace').strip()
+            raise RuntimeError('Failed to organize files (exit status {}): {}'.format(exit_status, message))
 
     def backup_config_files(self, experiment_name, run_number, file_paths, backup_root):
         """Makes a copy of the config files on the remote computer.
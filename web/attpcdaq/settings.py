@@ -190,20 +190,41 @@ if IS_PRODUCTION:
 else:
     BROKER_URL = 'amqp://'
 
-CELERY_RESULT_BACKEND = 'rpc://'
+# None of the tasks return anything and nothing waits on them, so no results are stored. A task that
+# needs its result can override this with @shared_task(ignore_result=False), but that will also
+# require setting CELERY_RESULT_BACKEND.
+CELERY_IGNORE_RESULT = True
+
+# Tasks that talk to a single remote host spend nearly all of their time waiting on the network, so
+# they go to their own queue. This is consumed by a worker using a large pool of threads
+# (see celery_remote_entrypoint.sh). Celery's time limits aren't enforced in a thread pool, so these tasks
+# rely on the SSH and SOAP timeouts (SSH_TIMEOUT in daq/workertasks.py, and ECC_TIMEOUT and
+# ECC_TRANSITION_TIMEOUT in daq/models.py).
+CELERY_ROUTES = {
+    'attpcdaq.daq.tasks.eccserver_refresh_state_task': {'queue': 'remote'},
+    'attpcdaq.daq.tasks.eccserver_change_state_task': {'queue': 'remote'},
+    'attpcdaq.daq.tasks.check_ecc_server_online_task': {'queue': 'remote'},
+    'attpcdaq.daq.tasks.check_data_router_status_task': {'queue': 'remote'},
+    'attpcdaq.daq.tasks.organize_files_task': {'queue': 'remote'},
+    'attpcdaq.daq.tasks.backup_config_files_task': {'queue': 'remote'},
+}
 
-# Periodic tasks
+# Periodic tasks. Each one expires after its period, so if the workers fall behind, a poll that is still
+# waiting in the queue when the next one is sent is dropped instead of piling up.
 CELERYBEAT_SCHEDULE = {
     'update-state-every-5-sec': {
         'task': 'attpcdaq.daq.tasks.eccserver_refresh_all_task',
         'schedule': timedelta(seconds=5),
+        'options': {'expires': 5},
     },
     'check-ecc-server-online-every-15-sec': {
         'task': 'attpcdaq.daq.tasks.check_ecc_server_online_all_task',
         'schedule': timedelta(seconds=15),
+        'options': {'expires': 15},
     },
     'check-data-router-status-every-15-sec': {
         'task': 'attpcdaq.daq.tasks.check_data_router_status_all_task',
         'schedule': timedelta(seconds=15),
+        'options': {'expires': 15},
     },
 }
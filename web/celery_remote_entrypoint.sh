@@ -0,0 +1,13 @@
+#!/bin/bash
+# This script is the entrypoint for the Celery worker that handles the "remote" queue. This queue holds
+# the tasks that communicate with the ECC servers and data routers, which mostly wait on the network,
+# so this worker uses a pool of threads instead of processes.
+# It begins by checking to see if RabbitMQ is ready.
+
+# Wait for RabbitMQ
+if ! python ready.py ${CELERY_BROKER_HOST} ${CELERY_BROKER_PORT}
+then
+    exit 1  # If we got here, something is wrong.
+fi
+
+celery -A attpcdaq worker -Q remote -P threads --concurrency 32 -n remote@%h  # start Celery